@@ -1,5 +1,6 @@
 import logging
 
+import anyio.to_thread
 from apscheduler.schedulers.background import BackgroundScheduler
 from fastapi import FastAPI, Request, status
 from fastapi.encoders import jsonable_encoder
@@ -8,7 +9,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
 
-from config import ALLOWED_ORIGINS, DOCS, XRAY_SUBSCRIPTION_PATH
+from config import (
+    ALLOWED_ORIGINS,
+    DOCS,
+    UVICORN_THREADPOOL_SIZE,
+    XRAY_SUBSCRIPTION_PATH,
+)
 
 __version__ = "0.8.4"
 
@@ -54,6 +60,11 @@ def on_startup():
         raise ValueError(
             f"you can't use /{XRAY_SUBSCRIPTION_PATH}/ as subscription path it reserved for {app.title}"
         )
+    # sync endpoints hold a worker thread for the whole DB round-trip,
+    # let as many run as there are pooled DB connections (see config.py)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = (
+        UVICORN_THREADPOOL_SIZE
+    )
     scheduler.start()
 
 
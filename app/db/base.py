@@ -1,3 +1,4 @@
+import orjson
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from config import (
@@ -8,17 +9,28 @@ from config import (
 
 IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
 
+
+def json_serializer(value) -> str:
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
 if IS_SQLITE:
     engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        json_serializer=json_serializer,
+        json_deserializer=orjson.loads,
     )
 else:
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
+        json_serializer=json_serializer,
+        json_deserializer=orjson.loads,
         pool_size=SQLALCHEMY_POOL_SIZE,
         max_overflow=SQLIALCHEMY_MAX_OVERFLOW,
         pool_recycle=3600,
         pool_timeout=10,
+        pool_pre_ping=True,
     )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
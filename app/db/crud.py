@@ -4,10 +4,10 @@ Functions for managing proxy hosts, users, user templates, nodes, and administra
 
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
-from sqlalchemy import and_, delete, func, or_
-from sqlalchemy.orm import Query, Session, joinedload
+from sqlalchemy import and_, delete, func, insert, or_, select
+from sqlalchemy.orm import Query, Session, joinedload, load_only, selectinload
 from sqlalchemy.sql.functions import coalesce
 
 from app.db.models import (
@@ -28,8 +28,16 @@ from app.db.models import (
     User,
     UserTemplate,
     UserUsageResetLogs,
+    excluded_inbounds_association,
+)
+from app.models.admin import (
+    AdminCreate,
+    AdminModify,
+    AdminPartialModify,
+    admins_cache,
+    admins_usage_cache,
+    authenticated_admins,
 )
-from app.models.admin import AdminCreate, AdminModify, AdminPartialModify
 from app.models.node import NodeCreate, NodeModify, NodeStatus, NodeUsageResponse
 from app.models.proxy import ProxyHost as ProxyHostModify
 from app.models.user import (
@@ -218,6 +226,31 @@ def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
     return get_user_queryset(db).filter(User.id == user_id).first()
 
 
+def get_users_by_ids(db: Session, user_ids: List[int]) -> List[User]:
+    """
+    Retrieves users by their IDs with the relationships of a user response eagerly loaded.
+
+    Args:
+        db (Session): Database session.
+        user_ids (List[int]): The IDs of the users.
+
+    Returns:
+        List[User]: List of users.
+    """
+    if not user_ids:
+        return []
+
+    return (
+        get_user_queryset(db)
+        .filter(User.id.in_(user_ids))
+        .options(
+            selectinload(User.proxies).selectinload(Proxy.excluded_inbounds),
+            selectinload(User.usage_logs),
+        )
+        .all()
+    )
+
+
 UsersSortingOptions = Enum(
     "UsersSortingOptions",
     {
@@ -312,6 +345,45 @@ def get_users(
     return query.all()
 
 
+def iter_users_with_proxies(
+    db: Session, admin: Admin, batch_size: int = 1000
+) -> Iterator[List[User]]:
+    """
+    Iterates over all users of an admin in batches, with their proxies and excluded inbounds eagerly loaded.
+
+    Batches are fetched by primary key ranges, so only one batch is held in memory and
+    the session can be written to and committed between batches.
+    Only the columns needed to rebuild a user's inbounds are loaded up front,
+    the rest are fetched on first access.
+
+    Args:
+        db (Session): Database session.
+        admin (Admin): Admin to filter users by.
+        batch_size (int): Number of users in each batch.
+
+    Yields:
+        List[User]: A batch of users.
+    """
+    last_id = 0
+    while True:
+        users = (
+            db.query(User)
+            .filter(User.admin == admin, User.id > last_id)
+            .options(
+                load_only(User.id, User.username, User.status),
+                selectinload(User.proxies).selectinload(Proxy.excluded_inbounds),
+            )
+            .order_by(User.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not users:
+            return
+
+        last_id = users[-1].id
+        yield users
+
+
 def get_user_usages(
     db: Session, dbuser: User, start: datetime, end: datetime
 ) -> List[UserUsageResponse]:
@@ -580,6 +652,94 @@ def update_user(db: Session, dbuser: User, modify: UserModify) -> User:
     return dbuser
 
 
+def bulk_update_user_proxies(db: Session, updates: List[dict]) -> None:
+    """
+    Syncs the proxies and excluded inbounds of many users at once.
+
+    Proxies of a type missing from a user's new proxies are removed, missing types are
+    added with the given settings and existing ones keep their settings. Every statement
+    covers all the given users and the changes are committed together. Updates without
+    any proxies are skipped, a user always keeps at least one.
+
+    Args:
+        db (Session): Database session.
+        updates (List[dict]): Items with the user "id", the new "proxies" settings and
+            the "excluded_inbounds" tags, both keyed by proxy type.
+    """
+    updates = [update for update in updates if update["proxies"]]
+    if not updates:
+        return
+
+    updates_by_user = {update["id"]: update for update in updates}
+    user_ids = list(updates_by_user)
+
+    tags = {
+        tag
+        for update in updates
+        for tags in update["excluded_inbounds"].values()
+        for tag in tags
+    }
+    if tags:
+        # not get_or_create_inbound, it commits and this must stay one transaction
+        existing_tags = set(
+            db.scalars(select(ProxyInbound.tag).where(ProxyInbound.tag.in_(tags)))
+        )
+        missing_tags = tags - existing_tags
+        if missing_tags:
+            db.execute(insert(ProxyInbound), [{"tag": tag} for tag in missing_tags])
+
+    existing = db.execute(
+        select(Proxy.id, Proxy.user_id, Proxy.type).where(Proxy.user_id.in_(user_ids))
+    ).all()
+
+    removed_ids = []
+    existing_types = {user_id: set() for user_id in user_ids}
+    for proxy_id, user_id, proxy_type in existing:
+        if proxy_type in updates_by_user[user_id]["proxies"]:
+            existing_types[user_id].add(proxy_type)
+        else:
+            removed_ids.append(proxy_id)
+
+    if removed_ids:
+        db.execute(
+            delete(excluded_inbounds_association).where(
+                excluded_inbounds_association.c.proxy_id.in_(removed_ids)
+            )
+        )
+        db.execute(delete(Proxy).where(Proxy.id.in_(removed_ids)))
+
+    added = [
+        {"user_id": user_id, "type": ProxyTypes(proxy_type), "settings": settings}
+        for user_id, update in updates_by_user.items()
+        for proxy_type, settings in update["proxies"].items()
+        if proxy_type not in existing_types[user_id]
+    ]
+    if added:
+        db.execute(insert(Proxy), added)
+
+    proxies = db.execute(
+        select(Proxy.id, Proxy.user_id, Proxy.type).where(Proxy.user_id.in_(user_ids))
+    ).all()
+    db.execute(
+        delete(excluded_inbounds_association).where(
+            excluded_inbounds_association.c.proxy_id.in_([p.id for p in proxies])
+        )
+    )
+    excluded = [
+        {"proxy_id": proxy_id, "inbound_tag": tag}
+        for proxy_id, user_id, proxy_type in proxies
+        for tag in updates_by_user[user_id]["excluded_inbounds"].get(proxy_type, [])
+    ]
+    if excluded:
+        db.execute(insert(excluded_inbounds_association), excluded)
+
+    db.query(User).filter(User.id.in_(user_ids)).update(
+        {User.edit_at: datetime.utcnow()}, synchronize_session=False
+    )
+
+    db.commit()
+
+
 def reset_user_data_usage(db: Session, dbuser: User) -> User:
     """
     Resets the data usage of a user and logs the reset.
@@ -730,13 +890,16 @@ def reset_all_users_data_usage(db: Session, admin: Optional[Admin] = None):
     db.commit()
 
 
-def disable_all_active_users(db: Session, admin: Optional[Admin] = None):
+def disable_all_active_users(db: Session, admin: Optional[Admin] = None) -> int:
     """
     Disable all active users or users under a specific admin.
 
     Args:
         db (Session): Database session.
         admin (Optional[Admin]): Admin to filter users by, if any.
+
+    Returns:
+        int: The number of disabled users.
     """
     query = db.query(User).filter(
         User.status.in_((UserStatus.active, UserStatus.on_hold))
@@ -744,15 +907,18 @@ def disable_all_active_users(db: Session, admin: Optional[Admin] = None):
     if admin:
         query = query.filter(User.admin == admin)
 
-    query.update(
+    disabled = query.update(
         {User.status: UserStatus.disabled, User.last_status_change: datetime.utcnow()},
         synchronize_session=False,
     )
 
     db.commit()
+    return disabled
 
 
-def activate_all_disabled_users(db: Session, admin: Optional[Admin] = None, users_limit: Optional[int] = None):
+def activate_all_disabled_users(
+    db: Session, admin: Optional[Admin] = None, users_limit: Optional[int] = None
+) -> int:
     """
     Activate all disabled users or users under a specific admin.
 
@@ -761,6 +927,9 @@ def activate_all_disabled_users(db: Session, admin: Optional[Admin] = None, user
         admin (Optional[Admin]): Admin to filter users by, if any.
         users_limit (Optional[int]): Maximum number of active users allowed for the admin.
             If None, no limit is applied.
+
+    Returns:
+        int: The number of activated (or put on hold) users.
     """
     query_for_active_users = db.query(User).filter(User.status == UserStatus.disabled)
     query_for_on_hold_users = db.query(User).filter(
@@ -776,21 +945,26 @@ def activate_all_disabled_users(db: Session, admin: Optional[Admin] = None, user
         query_for_on_hold_users = query_for_on_hold_users.filter(User.admin == admin)
 
     if users_limit is not None:
-        users_to_update = query_for_active_users.limit(users_limit).all()
-        for user in users_to_update:
-            user.status = UserStatus.active
-            user.last_status_change = datetime.utcnow()
-    else:
-        query_for_active_users.update(
-            {User.status: UserStatus.active, User.last_status_change: datetime.utcnow()},
-            synchronize_session=False,
-        )
-    query_for_on_hold_users.update(
+        # MySQL doesn't support LIMIT in an IN subquery, so the ids are fetched first
+        user_ids = [
+            user_id
+            for (user_id,) in query_for_active_users.with_entities(User.id)
+            .limit(users_limit)
+            .all()
+        ]
+        query_for_active_users = db.query(User).filter(User.id.in_(user_ids))
+
+    activated = query_for_active_users.update(
+        {User.status: UserStatus.active, User.last_status_change: datetime.utcnow()},
+        synchronize_session=False,
+    )
+    activated += query_for_on_hold_users.update(
         {User.status: UserStatus.on_hold, User.last_status_change: datetime.utcnow()},
         synchronize_session=False,
     )
 
     db.commit()
+    return activated
 
 
 def autodelete_expired_users(
@@ -997,6 +1171,13 @@ def get_admin(db: Session, username: str) -> Admin:
     return db.query(Admin).filter(Admin.username == username).first()
 
 
+def _clear_admin_caches(username: str) -> None:
+    """Drops what the API caches about admins once one of them changed."""
+    admins_cache.clear()
+    admins_usage_cache.delete(username)
+    authenticated_admins.clear()
+
+
 def create_admin(db: Session, admin: AdminCreate) -> Admin:
     """
     Creates a new admin in the database.
@@ -1018,6 +1199,7 @@ def create_admin(db: Session, admin: AdminCreate) -> Admin:
     db.add(dbadmin)
     db.commit()
     db.refresh(dbadmin)
+    _clear_admin_caches(dbadmin.username)
     return dbadmin
 
 
@@ -1048,6 +1230,7 @@ def update_admin(db: Session, dbadmin: Admin, modified_admin: AdminModify) -> Ad
 
     db.commit()
     db.refresh(dbadmin)
+    _clear_admin_caches(dbadmin.username)
     return dbadmin
 
 
@@ -1080,6 +1263,7 @@ def partial_update_admin(
 
     db.commit()
     db.refresh(dbadmin)
+    _clear_admin_caches(dbadmin.username)
     return dbadmin
 
 
@@ -1094,8 +1278,10 @@ def remove_admin(db: Session, dbadmin: Admin) -> Admin:
     Returns:
         Admin: The removed admin object.
     """
+    username = dbadmin.username
     db.delete(dbadmin)
     db.commit()
+    _clear_admin_caches(username)
     return dbadmin
 
 
@@ -1173,6 +1359,7 @@ def reset_admin_usage(db: Session, dbadmin: Admin) -> int:
 
     db.commit()
     db.refresh(dbadmin)
+    _clear_admin_caches(dbadmin.username)
     return dbadmin
 
 
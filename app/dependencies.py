@@ -3,7 +3,7 @@ from app.models.admin import AdminInDB, AdminValidationResult, Admin
 from app.models.user import UserResponse, UserStatus
 from app.db import Session, crud, get_db
 from config import SUDOERS
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from datetime import datetime, timezone, timedelta
 from app.utils.jwt import get_subscription_payload
 
@@ -22,8 +22,16 @@ def validate_admin(
     return None
 
 
-def get_admin_by_username(username: str, db: Session = Depends(get_db)):
+def get_admin_by_username(
+    username: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(Admin.get_current),
+):
     """Fetch an admin by username from the database."""
+    if username == current_admin.username and request.state.dbadmin:
+        return request.state.dbadmin
+
     dbadmin = crud.get_admin(db, username)
     if not dbadmin:
         raise HTTPException(status_code=404, detail="Admin not found")
@@ -1,17 +1,25 @@
+import time
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from pydantic import BaseModel, ConfigDict, field_validator
 
 from app.db import Session, crud, get_db
 from app.utils.jwt import get_admin_payload
+from app.utils.store import TTLStorage
 from config import SUDOERS
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/admin/token")  # Admin view url
 
+# dashboards poll the admin endpoints, a little staleness saves a query per poll.
+# crud clears these on admin changes, changes made by marzban-cli apply within the ttl
+admins_cache = TTLStorage(ttl=5, maxsize=128)
+admins_usage_cache = TTLStorage(ttl=10)
+authenticated_admins = TTLStorage(ttl=10, maxsize=1024)  # token -> sudo Admin
+
 
 class Token(BaseModel):
     access_token: str
@@ -41,55 +49,90 @@ class Admin(BaseModel):
 
     @classmethod
     def get_admin(cls, token: str, db: Session):
+        admin, _ = cls.authenticate(token, db)
+        return admin
+
+    @classmethod
+    def authenticate(cls, token: str, db: Session):
+        """Resolve the admin of a token along with its database row, if it has one."""
         payload = get_admin_payload(token)
         if not payload:
-            return
+            return None, None
 
         if payload["username"] in SUDOERS and payload["is_sudo"] is True:
-            return cls(username=payload["username"], is_sudo=True)
+            return cls(username=payload["username"], is_sudo=True), None
 
         dbadmin = crud.get_admin(db, payload["username"])
         if not dbadmin:
-            return
+            return None, None
 
         if dbadmin.password_reset_at:
             if not payload.get("created_at"):
-                return
+                return None, None
             if dbadmin.password_reset_at > payload.get("created_at"):
-                return
+                return None, None
 
-        return cls.model_validate(dbadmin)
+        return cls.model_validate(dbadmin), dbadmin
 
     @classmethod
     def get_current(
-        cls, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+        cls,
+        request: Request,
+        db: Session = Depends(get_db),
+        token: str = Depends(oauth2_scheme),
     ):
-        admin = cls.get_admin(token, db)
+        # resolved once per request, other dependencies reuse it from request.state
+        admin = getattr(request.state, "admin", None)
+        if admin:
+            return admin
+
+        admin, dbadmin = cls.authenticate(token, db)
         if not admin:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        request.state.admin = admin
+        request.state.dbadmin = dbadmin
         return admin
 
     @classmethod
     def check_sudo_admin(
-        cls, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+        cls,
+        request: Request,
+        db: Session = Depends(get_db),
+        token: str = Depends(oauth2_scheme),
     ):
-        admin = cls.get_admin(token, db)
-        if not admin:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        admin = cls.get_current(request, db, token)
         if not admin.is_sudo:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, detail="You're not allowed"
             )
         return admin
 
+    @classmethod
+    def check_sudo_admin_cached(
+        cls,
+        request: Request,
+        db: Session = Depends(get_db),
+        token: str = Depends(oauth2_scheme),
+    ):
+        """Same as check_sudo_admin, but trusts a recent check of the same token."""
+        admin = authenticated_admins.get(token)
+        if admin:
+            if not getattr(request.state, "admin", None):
+                request.state.admin, request.state.dbadmin = admin, None
+            return admin
+
+        admin = cls.check_sudo_admin(request, db, token)
+        ttl = authenticated_admins.ttl
+        expires_at = get_admin_payload(token)["expires_at"]
+        if expires_at:
+            ttl = min(ttl, expires_at - time.time())
+        authenticated_admins.set(token, admin, ttl=ttl)
+        return admin
+
 
 class AdminCreate(Admin):
     password: str
@@ -1,4 +1,3 @@
-import json
 import re
 from enum import Enum
 from typing import Optional, Union
@@ -63,7 +62,7 @@ class ProxySettings(BaseModel, use_enum_values=True):
 
     def dict(self, *, no_obj=False, **kwargs):
         if no_obj:
-            return json.loads(self.json())
+            return self.model_dump(mode="json")
         return super().dict(**kwargs)
 
 
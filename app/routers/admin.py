@@ -1,28 +1,35 @@
 from typing import List, Optional, Dict
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 from app import xray
 from app.db import Session, crud, get_db
+from app.db import User as DBUser
 from app.dependencies import get_admin_by_username, validate_admin
-from app.models.admin import Admin, AdminCreate, AdminModify, Token
-from app.models.proxy import (
-    ProxyInbound,
-    ProxyTypes,
-    ShadowsocksSettings,
-    VLESSSettings,
-    VMessSettings,
-    TrojanSettings,
+from app.models.admin import (
+    Admin,
+    AdminCreate,
+    AdminModify,
+    Token,
+    admins_cache,
+    admins_usage_cache,
 )
+from app.models.proxy import ProxyInbound, ProxyTypes
 from app.models.user import UserStatus, UserModify
 from app.utils import report, responses
 from app.morebot import Morebot
 from app.utils.jwt import create_admin_token
 from config import LOGIN_NOTIFY_WHITE_LIST
 
-router = APIRouter(tags=["Admin"], prefix="/api", responses={401: responses._401})
+router = APIRouter(
+    tags=["Admin"],
+    prefix="/api",
+    responses={401: responses._401},
+    default_response_class=ORJSONResponse,
+)
 
 
 def get_client_ip(request: Request) -> str:
@@ -138,10 +145,18 @@ def get_admins(
     limit: Optional[int] = None,
     username: Optional[str] = None,
     db: Session = Depends(get_db),
-    admin: Admin = Depends(Admin.check_sudo_admin),
+    admin: Admin = Depends(Admin.check_sudo_admin_cached),
 ):
     """Fetch a list of admins with optional filters for pagination and username."""
-    return crud.get_admins(db, offset, limit, username)
+    key = (offset, limit, username)
+    admins = admins_cache.get(key)
+    if admins is None:
+        admins = [
+            Admin.model_validate(dbadmin)
+            for dbadmin in crud.get_admins(db, offset, limit, username)
+        ]
+        admins_cache.set(key, admins)
+    return admins
 
 
 @router.post(
@@ -154,12 +169,13 @@ def disable_all_active_users(
     admin: Admin = Depends(Admin.check_sudo_admin),
 ):
     """Disable all active users under a specific admin"""
-    crud.disable_all_active_users(db=db, admin=dbadmin)
+    if not crud.disable_all_active_users(db=db, admin=dbadmin):
+        # restarting the core drops every live connection, don't do it for nothing
+        return {"detail": "No active users to disable"}
+
     startup_config = xray.config.include_db_users()
     xray.core.restart(startup_config)
-    for node_id, node in list(xray.nodes.items()):
-        if node.connected:
-            xray.operations.restart_node(node_id, startup_config)
+    xray.operations.restart_connected_nodes(startup_config)
     return {"detail": "Users successfully disabled"}
 
 
@@ -174,12 +190,14 @@ def activate_all_disabled_users(
 ):
     """Activate all disabled users under a specific admin"""
     users_limit = Morebot.get_users_limit(dbadmin.username)
-    crud.activate_all_disabled_users(db=db, admin=dbadmin, users_limit=users_limit)
+    if not crud.activate_all_disabled_users(
+        db=db, admin=dbadmin, users_limit=users_limit
+    ):
+        return {"detail": "No disabled users to activate"}
+
     startup_config = xray.config.include_db_users()
     xray.core.restart(startup_config)
-    for node_id, node in list(xray.nodes.items()):
-        if node.connected:
-            xray.operations.restart_node(node_id, startup_config)
+    xray.operations.restart_connected_nodes(startup_config)
     return {"detail": "Users successfully activated"}
 
 
@@ -194,7 +212,8 @@ def reset_admin_usage(
     current_admin: Admin = Depends(Admin.check_sudo_admin),
 ):
     """Resets usage of admin."""
-    return crud.reset_admin_usage(db, dbadmin)
+    dbadmin = crud.reset_admin_usage(db, dbadmin)
+    return dbadmin
 
 
 @router.get(
@@ -203,11 +222,83 @@ def reset_admin_usage(
     responses={403: responses._403},
 )
 def get_admin_usage(
-    dbadmin: Admin = Depends(get_admin_by_username),
-    current_admin: Admin = Depends(Admin.check_sudo_admin),
+    username: str,
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(Admin.check_sudo_admin_cached),
 ):
     """Retrieve the usage of given admin."""
-    return dbadmin.users_usage
+    users_usage = admins_usage_cache.get(username)
+    if users_usage is None:
+        dbadmin = crud.get_admin(db, username)
+        if not dbadmin:
+            raise HTTPException(status_code=404, detail="Admin not found")
+        users_usage = dbadmin.users_usage
+        admins_usage_cache.set(username, users_usage)
+    return users_usage
+
+
+def _get_sync_update(
+    user: DBUser,
+    new_inbounds: Dict[str, List[str]],
+    allowed_inbounds: Dict[str, frozenset],
+) -> Optional[dict]:
+    """Build the proxies update a user needs to match the allowed inbounds, if any."""
+    current_proxies = {p.type.value: p.settings for p in user.proxies}
+    # tag order carries no meaning, compare as sets to skip users already in sync
+    if current_proxies.keys() == allowed_inbounds.keys() and all(
+        allowed_inbounds[protocol] == frozenset(tags)
+        for protocol, tags in user.inbounds.items()
+    ):
+        return None
+
+    new_proxies = {
+        proxy_type: settings
+        for proxy_type, settings in current_proxies.items()
+        if proxy_type in allowed_inbounds
+    }
+    for protocol in new_inbounds:
+        if protocol not in new_proxies:
+            # defaults hold freshly generated credentials, so they are never shared
+            new_proxies[protocol] = ProxyTypes(protocol).settings_model().dict()
+    if not new_proxies:
+        return None  # no configs given, leave the user's proxies alone
+
+    modify = UserModify(inbounds=new_inbounds, proxies=new_proxies)
+    return {
+        "id": user.id,
+        "proxies": {
+            proxy_type: settings.dict(no_obj=True)
+            for proxy_type, settings in modify.proxies.items()
+        },
+        "excluded_inbounds": modify.excluded_inbounds,
+    }
+
+
+def _apply_sync_updates(
+    db: Session, updates: List[dict], xray_user_ids: List[int]
+) -> int:
+    """Bulk-write sync updates and push changed users to xray, return the failed count."""
+    try:
+        crud.bulk_update_user_proxies(db, updates)
+    except SQLAlchemyError:
+        db.rollback()
+        return len(updates)
+
+    # the commit expired every user, reload them together rather than one by one
+    try:
+        users = crud.get_users_by_ids(db, xray_user_ids)
+    except SQLAlchemyError:
+        db.rollback()
+        return len(xray_user_ids)
+
+    unsuccessful = 0
+    nodes = xray.operations.get_ready_nodes()
+    for user in users:
+        try:
+            xray.operations.update_user(user, nodes)
+        except Exception:
+            unsuccessful += 1
+    return unsuccessful
 
 
 #! IF this is dirty, because your system is dirty!
@@ -247,62 +338,35 @@ def sync_admin(
                 status_code=409, detail="Failed to disable users before sync. Aborting."
             )
 
-    users = crud.get_users(db=db, admin=dbadmin)
     unsuccessful = 0
 
     allowed_inbounds = {
+        protocol: frozenset(inbound["tag"] for inbound in inbounds)
+        for protocol, inbounds in configs.items()
+    }
+    # a user's tags are filtered down to the allowed ones and then joined
+    # with them again, so every user ends up with exactly the allowed tags
+    new_inbounds = {
         protocol: [inbound["tag"] for inbound in inbounds]
         for protocol, inbounds in configs.items()
     }
 
-    for user in users:
-        try:
-            new_inbounds = {}
-            if user.inbounds:
-                for protocol, tags in user.inbounds.items():
-                    if protocol in allowed_inbounds:
-                        new_tags = [
-                            tag for tag in tags if tag in allowed_inbounds[protocol]
-                        ]
-                        if new_tags:
-                            new_inbounds[protocol] = new_tags
-
-            for protocol, tags in allowed_inbounds.items():
-                if protocol in new_inbounds:
-                    existing_tags = set(new_inbounds[protocol])
-                    new_tags = list(existing_tags.union(tags))
-                    new_inbounds[protocol] = new_tags
-                else:
-                    new_inbounds[protocol] = tags
-
-            new_proxies = {
-                p.type.value: p.settings
-                for p in user.proxies
-                if p.type.value in new_inbounds
-            }
-
-            for protocol in new_inbounds:
-                if protocol not in new_proxies:
-                    if protocol == ProxyTypes.Shadowsocks.value:
-                        new_proxies[protocol] = ShadowsocksSettings().dict()
-                    elif protocol == ProxyTypes.VMess.value:
-                        new_proxies[protocol] = VMessSettings().dict()
-                    elif protocol == ProxyTypes.VLESS.value:
-                        new_proxies[protocol] = VLESSSettings().dict()
-                    elif protocol == ProxyTypes.Trojan.value:
-                        new_proxies[protocol] = TrojanSettings().dict()
-
-            current_proxies = {p.type.value: p.settings for p in user.proxies}
-            if new_inbounds != user.inbounds or new_proxies != current_proxies:
-                user = crud.update_user(
-                    db, user, UserModify(inbounds=new_inbounds, proxies=new_proxies)
-                )
+    for users in crud.iter_users_with_proxies(db=db, admin=dbadmin):
+        pending_updates = []
+        pending_xray = []
 
+        for user in users:
+            try:
+                update = _get_sync_update(user, new_inbounds, allowed_inbounds)
+            except Exception:
+                unsuccessful += 1
+                continue
+
+            if update:
+                pending_updates.append(update)
                 if user.status in [UserStatus.active, UserStatus.on_hold]:
-                    xray.operations.update_user(user)
+                    pending_xray.append(user.id)
 
-        except Exception:
-            db.rollback()
-            unsuccessful += 1
+        unsuccessful += _apply_sync_updates(db, pending_updates, pending_xray)
 
     return {"detail": f"Sync completed with {unsuccessful} unsuccessful updates."}
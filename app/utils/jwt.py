@@ -48,6 +48,7 @@ def get_admin_payload(token: str) -> Union[dict, None]:
             "username": username,
             "is_sudo": access == "sudo",
             "created_at": created_at,
+            "expires_at": payload.get("exp"),
         }
     except jwt.exceptions.PyJWTError:
         return
@@ -1,3 +1,7 @@
+import threading
+import time
+
+
 class MemoryStorage:
     def __init__(self):
         self._data = {}
@@ -15,6 +19,47 @@ class MemoryStorage:
         self._data.clear()
 
 
+class TTLStorage(MemoryStorage):
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        super().__init__()
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()  # sync endpoints share it across threads
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                self._evict()
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def get(self, key, default=None):
+        with self._lock:
+            expires_at, value = self._data.get(key, (None, default))
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [
+            key for key, (expires_at, _) in self._data.items() if expires_at < now
+        ]
+        for key in expired:
+            del self._data[key]
+        if len(self._data) >= self.maxsize:
+            del self._data[next(iter(self._data))]  # drop the oldest entry
+
+
 class ListStorage(list):
     def __init__(self, update_func):
         super().__init__()
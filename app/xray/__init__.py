@@ -1,5 +1,5 @@
 from random import randint
-from typing import TYPE_CHECKING, Dict, Sequence
+from typing import TYPE_CHECKING, Dict, Sequence, Set
 
 from app.models.proxy import ProxyHostSecurity
 from app.utils.store import DictStorage
@@ -27,6 +27,7 @@ finally:
 api = XRayAPI(config.api_host, config.api_port)
 
 nodes: Dict[int, XRayNode] = {}
+connected_nodes: Set[int] = set()  # ids of the nodes last seen connected
 
 
 if TYPE_CHECKING:
@@ -79,6 +80,7 @@ __all__ = [
     "core",
     "api",
     "nodes",
+    "connected_nodes",
     "operations",
     "exceptions",
     "exc",
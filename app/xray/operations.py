@@ -1,5 +1,5 @@
 from functools import lru_cache
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, List, Optional
 
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -115,7 +115,17 @@ def remove_user(dbuser: "DBUser"):
                 _remove_user_from_inbound(node.api, inbound_tag, email)
 
 
-def update_user(dbuser: "DBUser"):
+def get_ready_nodes() -> List[XRayNode]:
+    # node.connected and node.started are both round-trips to the node
+    return [
+        node for node in list(xray.nodes.values()) if node.connected and node.started
+    ]
+
+
+def update_user(dbuser: "DBUser", nodes: Optional[List[XRayNode]] = None):
+    if nodes is None:
+        nodes = get_ready_nodes()
+
     user = UserResponse.model_validate(dbuser)
     email = f"{dbuser.id}.{dbuser.username}"
 
@@ -143,18 +153,16 @@ def update_user(dbuser: "DBUser"):
                 account.flow = XTLSFlows.NONE
 
             _alter_inbound_user(xray.api, inbound_tag, account)  # main core
-            for node in list(xray.nodes.values()):
-                if node.connected and node.started:
-                    _alter_inbound_user(node.api, inbound_tag, account)
+            for node in nodes:
+                _alter_inbound_user(node.api, inbound_tag, account)
 
     for inbound_tag in xray.config.inbounds_by_tag:
         if inbound_tag in active_inbounds:
             continue
         # remove disabled inbounds
         _remove_user_from_inbound(xray.api, inbound_tag, email)
-        for node in list(xray.nodes.values()):
-            if node.connected and node.started:
-                _remove_user_from_inbound(node.api, inbound_tag, email)
+        for node in nodes:
+            _remove_user_from_inbound(node.api, inbound_tag, email)
 
 
 def remove_node(node_id: int):
@@ -168,6 +176,7 @@ def remove_node(node_id: int):
                 del xray.nodes[node_id]
             except KeyError:
                 pass
+            xray.connected_nodes.discard(node_id)
 
 
 def add_node(dbnode: "DBNode"):
@@ -189,6 +198,11 @@ def add_node(dbnode: "DBNode"):
 def _change_node_status(
     node_id: int, status: NodeStatus, message: str = None, version: str = None
 ):
+    if status == NodeStatus.connected:
+        xray.connected_nodes.add(node_id)
+    else:
+        xray.connected_nodes.discard(node_id)
+
     with GetDB() as db:
         try:
             dbnode = crud.get_node_by_id(db, node_id)
@@ -285,6 +299,18 @@ def restart_node(node_id, config=None):
             pass
 
 
+@threaded_function
+def _restart_node_if_connected(node_id, config=None):
+    node = xray.nodes.get(node_id)
+    if node and node.connected:
+        restart_node(node_id, config)
+
+
+def restart_connected_nodes(config=None):
+    for node_id in tuple(xray.connected_nodes):
+        _restart_node_if_connected(node_id, config)
+
+
 __all__ = [
     "add_user",
     "remove_user",
@@ -292,4 +318,5 @@ __all__ = [
     "remove_node",
     "connect_node",
     "restart_node",
+    "restart_connected_nodes",
 ]
@@ -19,6 +19,11 @@ UVICORN_UDS = config("UVICORN_UDS", default=None)
 UVICORN_SSL_CERTFILE = config("UVICORN_SSL_CERTFILE", default=None)
 UVICORN_SSL_KEYFILE = config("UVICORN_SSL_KEYFILE", default=None)
 UVICORN_SSL_CA_TYPE = config("UVICORN_SSL_CA_TYPE", default="public").lower()
+# number of worker threads used to run sync endpoints (anyio's default is 40),
+# defaults to one per pooled DB connection since each handler holds a session
+UVICORN_THREADPOOL_SIZE = config(
+    "UVICORN_THREADPOOL_SIZE", cast=int, default=SQLALCHEMY_POOL_SIZE
+)
 DASHBOARD_PATH = config("DASHBOARD_PATH", default="/dashboard/")
 
 DEBUG = config("DEBUG", default=False, cast=bool)
@@ -99,11 +104,11 @@ GRPC_USER_AGENT_TEMPLATE = config(
 )
 
 EXTERNAL_CONFIG = config("EXTERNAL_CONFIG", default="", cast=str)
-LOGIN_NOTIFY_WHITE_LIST = [
+LOGIN_NOTIFY_WHITE_LIST = frozenset(
     ip.strip()
     for ip in config("LOGIN_NOTIFY_WHITE_LIST", default="", cast=str).split(",")
     if ip.strip()
-]
+)
 
 USE_CUSTOM_JSON_DEFAULT = config("USE_CUSTOM_JSON_DEFAULT", default=False, cast=bool)
 USE_CUSTOM_JSON_FOR_V2RAYN = config(